@@ -1,45 +1,190 @@
 """Models for simulation of quantum circuit.
 
-This module introduces the QuantumCircuit class. The qutip library is used to calculate the unitary matrix of a circuit.
+This module introduces the QuantumCircuit class. The unitary matrix of a circuit is calculated by applying
+the (fused) matrix of each gate to the target qubits.
 """
 
+from functools import lru_cache
 from math import e, pi
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
-from qutip.qip.circuit import QubitCircuit
-from qutip.qip.operations import gate_sequence_product
-from qutip import Qobj
+
+
+def h_gate():
+    mat = np.array([[1, 1],
+                    [1, -1]], dtype=complex)
+    return mat / np.sqrt(2)
 
 
 def x_gate():
     mat = np.array([[0, 1],
-                    [1, 0]])
-    return Qobj(mat, dims=[[2], [2]])
+                    [1, 0]], dtype=complex)
+    return mat
 
 
 def y_gate():
     mat = np.array([[0, -1.j],
-                    [1.j, 0]])
-    return Qobj(mat, dims=[[2], [2]])
+                    [1.j, 0]], dtype=complex)
+    return mat
 
 
 def z_gate():
     mat = np.array([[1, 0],
-                    [0, -1]])
-    return Qobj(mat, dims=[[2], [2]])
+                    [0, -1]], dtype=complex)
+    return mat
 
 
 def s_gate():
     mat = np.array([[1.,   0],
-                    [0., 1.j]])
-    return Qobj(mat, dims=[[2], [2]])
+                    [0., 1.j]], dtype=complex)
+    return mat
 
 
 def t_gate():
     mat = np.array([[1.,   0],
-                    [0., e ** (1.j * (pi / 4))]])
-    return Qobj(mat, dims=[[2], [2]])
+                    [0., e ** (1.j * (pi / 4))]], dtype=complex)
+    return mat
+
+
+def cx_gate():
+    mat = np.identity(4, dtype=complex)
+    mat[2:, 2:] = x_gate()
+    return mat
+
+
+def ccx_gate():
+    mat = np.identity(8, dtype=complex)
+    mat[6:, 6:] = x_gate()
+    return mat
+
+
+def swap_gate():
+    mat = np.identity(4, dtype=complex)
+    mat[[1, 2]] = mat[[2, 1]]
+    return mat
+
+
+GATES = {'h': h_gate(),
+         'x': x_gate(),
+         'y': y_gate(),
+         'z': z_gate(),
+         's': s_gate(),
+         't': t_gate(),
+         'cx': cx_gate(),
+         'ccx': ccx_gate(),
+         'swap': swap_gate()}
+
+# gate matrices are shared by all circuits (and returned by `fuse`), so are made read-only
+for _mat in GATES.values():
+    _mat.flags.writeable = False
+
+
+def fuse(gates: List[list]) -> List[Tuple["np.ndarray", List[int]]]:
+    """Function to fuse consecutive gates acting on the same qubits.
+
+    Each run of consecutive gates with identical target indices is replaced by the product of their matrices,
+    so that the run costs a single application.
+
+    Args:
+        gates (List[list]): list of gates as (name, indices) pairs (see `Circuit.gates`).
+
+    Returns:
+        List[Tuple[np.ndarray, List[int]]]: list of (matrix, indices) pairs for fused gates.
+    """
+
+    fused = []
+    for name, indices in gates:
+        if name not in GATES:
+            raise NotImplementedError
+        mat = GATES[name]
+        if len(fused) > 0 and fused[-1][1] == indices:
+            fused[-1] = (mat @ fused[-1][0], indices)
+        else:
+            fused.append((mat, indices))
+    return fused
+
+
+def apply_gate(unitary: "np.ndarray", mat: "np.ndarray", indices: List[int], size: int) -> "np.ndarray":
+    """Function to apply a gate matrix to the target qubits of a circuit unitary.
+
+    Target axes are moved to the front so that the gate is applied with a single matrix product.
+
+    Args:
+        unitary (np.ndarray): unitary matrix of circuit (2 ** size x 2 ** size).
+        mat (np.ndarray): matrix of gate (2 ** len(indices) x 2 ** len(indices)).
+        indices (List[int]): indices of qubits the gate acts on.
+        size (int): number of qubits in the circuit.
+
+    Returns:
+        np.ndarray: new unitary matrix of circuit.
+    """
+
+    dim = 2 ** size
+    perm = list(indices) + [i for i in range(size) if i not in indices] + [size]
+    inv_perm = np.argsort(perm)
+    unitary = unitary.reshape((2,) * size + (dim,)).transpose(perm).reshape(mat.shape[0], -1)
+    unitary = mat @ unitary
+    return unitary.reshape((2,) * size + (dim,)).transpose(inv_perm).reshape(dim, dim)
+
+
+def matrix_structure(mat: "np.ndarray") -> Tuple[str, "np.ndarray"]:
+    """Function to classify the unitary matrix of a circuit as diagonal, permutation, or dense.
+
+    Diagonal circuits (e.g. Z, S, T) may be applied as an elementwise product,
+    and permutation circuits (e.g. X, CNOT, SWAP) as a reordering of amplitudes.
+
+    Args:
+        mat (np.ndarray): unitary matrix of circuit.
+
+    Returns:
+        Tuple[str, np.ndarray]: "diagonal" with the diagonal (as a column), "permutation" with the source row of each output row,
+            or "dense" with None.
+    """
+
+    dim = mat.shape[0]
+    nonzero = np.count_nonzero(mat)
+    diagonal = mat.diagonal()
+    if nonzero == np.count_nonzero(diagonal):
+        data = diagonal.reshape(dim, 1).copy()
+        data.flags.writeable = False
+        return "diagonal", data
+    rows = np.argmax(np.absolute(mat), axis=1)
+    if nonzero == dim and (mat[np.arange(dim), rows] == 1).all():
+        rows.flags.writeable = False
+        return "permutation", rows
+    return "dense", None
+
+
+@lru_cache(maxsize=1000)
+def unitary_matrix(size: int, gates: Tuple[Tuple[str, Tuple[int]]],
+                   dtype: "np.dtype" = np.dtype(np.complex128),
+                   conjugate: bool = False) -> Tuple["np.ndarray", str, "np.ndarray"]:
+    """Function to calculate (and cache) the unitary matrix of a circuit, along with its structure.
+
+    Circuits with the same structure share a single (read-only) matrix for each dtype.
+    The complex conjugate (applied to the columns of density matrices) is cached in the same way.
+
+    Args:
+        size (int): number of qubits in the circuit.
+        gates (Tuple[Tuple[str, Tuple[int]]]): gates of circuit as (name, indices) pairs.
+        dtype (np.dtype): complex dtype of returned matrix (default complex128).
+        conjugate (bool): if True, return the complex conjugate of the matrix (default False).
+
+    Returns:
+        Tuple[np.ndarray, str, np.ndarray]: the unitary matrix of the circuit (C-contiguous, of `dtype`),
+            and its structure (see `matrix_structure`).
+    """
+
+    if conjugate:
+        unitary = np.ascontiguousarray(unitary_matrix(size, gates, dtype)[0].conj())
+    else:
+        unitary = np.identity(2 ** size, dtype=complex)
+        for mat, indices in fuse([[name, list(indices)] for name, indices in gates]):
+            unitary = apply_gate(unitary, mat, indices, size)
+        unitary = np.ascontiguousarray(unitary, dtype=dtype)
+    unitary.flags.writeable = False
+    return (unitary,) + matrix_structure(unitary)
 
 
 def validator(func):
@@ -75,49 +220,39 @@ class Circuit():
         self.measured_qubits = []
         self._cache = None
 
-    def get_unitary_matrix(self) -> "np.ndarray":
+    def get_unitary_matrix(self, dtype=np.complex128, conjugate=False) -> "np.ndarray":
         """Method to get unitary matrix of circuit without measurement.
 
+        Args:
+            dtype (np.dtype): complex dtype of returned matrix (default complex128).
+            conjugate (bool): if True, return the complex conjugate of the matrix (default False).
+
         Returns:
             np.ndarray: the matrix for the circuit operations.
         """
 
+        return self._get_cache(dtype, conjugate)[0]
+
+    def get_matrix_structure(self, dtype=np.complex128, conjugate=False) -> Tuple[str, "np.ndarray"]:
+        """Method to get structure of unitary matrix of circuit (see `matrix_structure`).
+
+        Args:
+            dtype (np.dtype): complex dtype of matrix (default complex128).
+            conjugate (bool): if True, return the structure of the complex conjugate of the matrix (default False).
+
+        Returns:
+            Tuple[str, np.ndarray]: kind of matrix ("diagonal", "permutation", or "dense") and associated data.
+        """
+
+        return self._get_cache(dtype, conjugate)[1:]
+
+    def _get_cache(self, dtype, conjugate) -> Tuple["np.ndarray", str, "np.ndarray"]:
         if self._cache is None:
-            if len(self.gates) == 0:
-                self._cache = np.identity(2 ** self.size)
-                return self._cache
-
-            qc = QubitCircuit(self.size)
-            qc.user_gates = {"X": x_gate,
-                             "Y": y_gate,
-                             "Z": z_gate,
-                             "S": s_gate,
-                             "T": t_gate}
-            for gate in self.gates:
-                name, indices = gate
-                if name == 'h':
-                    qc.add_gate('SNOT', indices[0])
-                elif name == 'x':
-                    qc.add_gate('X', indices[0])
-                elif name == 'y':
-                    qc.add_gate('Y', indices[0])
-                elif name == 'z':
-                    qc.add_gate('Z', indices[0])
-                elif name == 'cx':
-                    qc.add_gate('CNOT', controls=indices[0], targets=indices[1])
-                elif name == 'ccx':
-                    qc.add_gate('TOFFOLI', controls=indices[:2], targets=indices[2])
-                elif name == 'swap':
-                    qc.add_gate('SWAP', indices)
-                elif name == 't':
-                    qc.add_gate('T', indices[0])
-                elif name == 's':
-                    qc.add_gate('S', indices[0])
-                else:
-                    raise NotImplementedError
-            self._cache = gate_sequence_product(qc.propagators()).full()
-            return self._cache
-        return self._cache
+            self._cache = {}
+        if (dtype, conjugate) not in self._cache:
+            gates = tuple([(name, tuple(indices)) for name, indices in self.gates])
+            self._cache[(dtype, conjugate)] = unitary_matrix(self.size, gates, np.dtype(dtype), conjugate)
+        return self._cache[(dtype, conjugate)]
 
     @validator
     def h(self, qubit: int):
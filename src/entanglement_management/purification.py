@@ -176,11 +176,10 @@ class BBPSSW(EntanglementProtocol):
         """
 
         assert memory in self.memories
-        if self.meas_memo is None:
-            self.update_resource_manager(memory, "RAW")
-        else:
-            for memory in self.memories:
-                self.update_resource_manager(memory, "RAW")
+        # with or without a measured memory, every memory in `memories` is released
+        # (without one, `memories` only holds the expired kept memory)
+        for memo in self.memories:
+            self.update_resource_manager(memo, "RAW")
 
     def release(self) -> None:
         pass
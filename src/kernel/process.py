@@ -16,6 +16,8 @@ class Process:
         act_params (List[Any]): the arguments of object.
     """
 
+    __slots__ = ('owner', 'activation', 'act_params')
+
     def __init__(self, owner: Any, activation_method: str, act_params: List[Any]):
         self.owner = owner
         self.activation = activation_method
@@ -9,30 +9,84 @@ The manager defines an API for interacting with quantum states.
 
 from abc import abstractmethod
 from copy import copy
+from functools import lru_cache
 from typing import List, Dict, Tuple, TYPE_CHECKING
 from math import sqrt
 
-from qutip.qip.circuit import QubitCircuit, Gate
-from qutip.qip.operations import gate_sequence_product
-from numpy import log2, array, kron, identity, zeros, arange, outer
+from numpy import log2, array, asarray, absolute, empty, kron, matmul, multiply, take, zeros, arange, outer, vdot
+from numpy import ascontiguousarray, finfo, complex128
 from numpy.random import random_sample, choice
 
 from .quantum_utils import *
 
 
+@lru_cache(maxsize=1000)
+def _target_permutation(target_indices: Tuple[int], num_qubits: int) -> Tuple[int]:
+    """Function to get the axis permutation moving target qubits to the front of a state tensor.
+
+    Args:
+        target_indices (Tuple[int]): index of each target qubit within the compound state.
+        num_qubits (int): total number of qubits in the compound state.
+
+    Returns:
+        Tuple[int]: permutation of the state tensor axes.
+    """
+
+    return target_indices + tuple([i for i in range(num_qubits) if i not in target_indices])
+
+
+# minimum state size (2 ** n amplitudes) for which `take` beats `matmul` for permutation circuits;
+# measured for 1-3 qubit permutation circuits (X, CNOT, Toffoli) in complex64 and complex128
+_PERMUTATION_MIN_SIZE = 64
+
+
+def _apply_to_front(circ_mat: "np.ndarray", kind: str, data: "np.ndarray", state: "np.ndarray",
+                    out: "np.ndarray" = None) -> "np.ndarray":
+    """Function to apply a circuit matrix to the first axis of an unfolded (2 ** k, -1) state.
+
+    Diagonal circuits are applied as an elementwise product (faster than `matmul` at all sizes).
+    Permutation circuits are applied with `take` for states of at least `_PERMUTATION_MIN_SIZE` elements.
+
+    Args:
+        circ_mat (np.ndarray): circuit matrix (2 ** k x 2 ** k).
+        kind (str): structure of matrix, "diagonal", "permutation", or "dense" (see `Circuit.get_matrix_structure`).
+        data (np.ndarray): diagonal (for "diagonal") or source rows (for "permutation") of circuit matrix.
+        state (np.ndarray): state with circuit qubits unfolded on the first axis.
+        out (np.ndarray): buffer for result (optional).
+
+    Returns:
+        np.ndarray: new state with the same shape as `state`.
+    """
+
+    if kind == "diagonal":
+        return multiply(data, state, out=out)
+    elif kind == "permutation" and state.size >= _PERMUTATION_MIN_SIZE:
+        # rows from `matrix_structure` are always in range; "clip" mode writes directly to `out` without buffering
+        return take(state, data, axis=0, out=out, mode="clip")
+    return matmul(circ_mat, state, out=out)
+
+
 class QuantumManager():
     """Class to track and manage quantum states (abstract).
 
     All states stored are of a single formalism (by default as a ket vector).
 
+    Amplitudes are stored as `complex128` by default.
+    Using `complex64` halves the memory traffic of applying circuits, at the cost of precision
+    (about 1e-7 relative error per circuit, acceptable for protocol-level fidelities).
+    For lower-precision types, states are renormalized after each circuit so that the error does not accumulate in the norm.
+
     Attributes:
-        states (Dict[int, KetState]): mapping of state keys to quantum state objects.
+        states (List[KetState]): quantum state objects, indexed by state key (removed keys hold `None`).
+        formalism (str): formalism of stored states.
+        dtype (type): numpy complex type of stored amplitudes.
     """
 
-    def __init__(self, formalism):
-        self.states = {}
-        self._least_available = 0
+    def __init__(self, formalism, dtype=complex128):
+        self.states = []
         self.formalism = formalism
+        self.dtype = dtype
+        self._renormalize = finfo(dtype).eps > finfo(complex128).eps
 
     @abstractmethod
     def new(self, amplitudes: any) -> int:
@@ -72,46 +126,104 @@ class QuantumManager():
         assert len(keys) == circuit.size, "mismatch between circuit size and supplied qubits"
 
 
-    def _prepare_circuit(self, circuit: "Circuit", keys: List[int]):
-        old_states = []
-        all_keys = []
+    def _apply_circuit(self, circuit: "Circuit", keys: List[int]) -> Tuple["np.ndarray", List[int]]:
+        """Method to apply the unitary of a circuit to the states of given keys.
 
-        # go through keys and get all unique qstate objects
-        for key in keys:
-            qstate = self.states[key]
-            if qstate.keys[0] not in all_keys:
-                old_states.append(qstate.state)
-                all_keys += qstate.keys
-
-        # construct compound state; order qubits
-        new_state = [1]
-        for state in old_states:
-            new_state = kron(new_state, state)
-
-        # get circuit matrix; expand if necessary
-        circ_mat = circuit.get_unitary_matrix()
-        if circuit.size < len(all_keys):
-            # pad size of circuit matrix if necessary
-            diff = len(all_keys) - circuit.size
-            circ_mat = kron(circ_mat, identity(2 ** diff))
-
-        # apply any necessary swaps
-        if not all([all_keys.index(key) == i for i, key in enumerate(keys)]):
-            all_keys, swap_mat = self._swap_qubits(all_keys, keys)
-            circ_mat = circ_mat @ swap_mat
-
-        return new_state, all_keys, circ_mat
-
-    def _swap_qubits(self, all_keys, keys):
-        swap_circuit = QubitCircuit(N=len(all_keys))
-        for i, key in enumerate(keys):
-            j = all_keys.index(key)
-            if j != i:
-                gate = Gate("SWAP", targets=[i, j])
-                swap_circuit.add_gate(gate)
-                all_keys[i], all_keys[j] = all_keys[j], all_keys[i]
-        swap_mat = gate_sequence_product(swap_circuit.propagators()).full()
-        return all_keys, swap_mat
+        The axes of the compound state tensor are permuted to put the circuit qubits first.
+        The circuit matrix is then applied with a single matrix product on the unfolded state,
+        so that it is never padded to the size of the compound state.
+        The returned state has the qubits of `keys` first (in order), followed by all other entangled qubits.
+
+        Args:
+            circuit (Circuit): quantum circuit to apply.
+            keys (List[int]): list of keys for quantum states to apply circuit to.
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: new compound state and list of keys for the new state.
+        """
+
+        qstate = self.states[keys[0]]
+        if all([self.states[key] is qstate for key in keys[1:]]):
+            # all qubits already in one compound state (common case)
+            new_state = qstate.state
+            all_keys = list(qstate.keys)
+
+        else:
+            old_states = []
+            all_keys = []
+            seen = set()
+
+            # go through keys and get all unique qstate objects
+            for key in keys:
+                qstate = self.states[key]
+                if id(qstate) not in seen:
+                    seen.add(id(qstate))
+                    old_states.append(qstate.state)
+                    all_keys += qstate.keys
+
+            # construct compound state
+            new_state = old_states[0]
+            for state in old_states[1:]:
+                new_state = kron(new_state, state)
+
+        new_state, all_keys = self._swap_qubits(new_state, all_keys, keys)
+        new_state = ascontiguousarray(new_state)
+
+        # apply circuit matrix to target axes (C-contiguous and of state dtype, for BLAS fast path; cached by circuit)
+        circ_mat = circuit.get_unitary_matrix(self.dtype)
+        kind, data = circuit.get_matrix_structure(self.dtype)
+        circ_dim = circ_mat.shape[0]
+        rest_dim = 2 ** (len(all_keys) - circuit.size)
+        if self.formalism == "DENSITY":
+            new_state = _apply_to_front(circ_mat, kind, data, new_state.reshape(circ_dim, -1))
+            new_state = new_state.reshape(circ_dim, rest_dim, circ_dim, rest_dim)
+            new_state = new_state.transpose(2, 0, 1, 3).reshape(circ_dim, -1)
+            # apply conjugate matrix to column axes (also cached by circuit)
+            circ_mat = circuit.get_unitary_matrix(self.dtype, conjugate=True)
+            kind, data = circuit.get_matrix_structure(self.dtype, conjugate=True)
+            new_state = _apply_to_front(circ_mat, kind, data, new_state)
+            new_state = new_state.reshape(circ_dim, circ_dim, rest_dim, rest_dim)
+            dim = circ_dim * rest_dim
+            new_state = new_state.transpose(1, 2, 0, 3).reshape(dim, dim)
+            if self._renormalize:
+                new_state /= trace(new_state).real
+            return new_state, all_keys
+
+        # write result directly into buffer for new state (avoids extra copy when setting KetState)
+        output = empty(2 ** len(all_keys), dtype=self.dtype)
+        _apply_to_front(circ_mat, kind, data, new_state.reshape(circ_dim, -1), out=output.reshape(circ_dim, -1))
+        if self._renormalize:
+            output /= sqrt(vdot(output, output).real)
+        return output, all_keys
+
+    def _swap_qubits(self, state: "np.ndarray", all_keys: List[int], keys: List[int]) -> Tuple["np.ndarray", List[int]]:
+        """Method to move the qubits of given keys to the front of a compound state.
+
+        The swap is done by permuting the axes of the (2,) * n state tensor, rather than multiplying by a swap matrix.
+
+        Args:
+            state (np.ndarray): compound state (ket vector or density matrix).
+            all_keys (List[int]): list of all keys corresponding to state.
+            keys (List[int]): keys to move to the front (in order).
+
+        Returns:
+            Tuple[np.ndarray, List[int]]: permuted state and list of keys for the permuted state.
+        """
+
+        num_qubits = len(all_keys)
+        target_indices = tuple([all_keys.index(key) for key in keys])
+        if target_indices == tuple(range(len(keys))):
+            # qubits already in position
+            return state, all_keys
+        perm = _target_permutation(target_indices, num_qubits)
+        all_keys = [all_keys[i] for i in perm]
+
+        state = asarray(state)
+        shape = state.shape
+        if state.ndim == 2:
+            perm = perm + tuple([num_qubits + i for i in perm])
+        state = state.reshape((2,) * (state.ndim * num_qubits)).transpose(perm).reshape(shape)
+        return state, all_keys
 
     @abstractmethod
     def set(self, keys: List[int], amplitudes: any) -> None:
@@ -128,31 +240,33 @@ class QuantumManager():
         assert num_qubits == len(keys), "Length of amplitudes should be 2 ** n, where n is the number of keys"
 
     def remove(self, key: int) -> None:
-        """Method to remove state stored at key."""
-        del self.states[key]
+        """Method to remove state stored at key.
+
+        The key is not reused; its slot is set to `None` to preserve the index of other states.
+        """
+        self.states[key] = None
 
 
 class QuantumManagerKet(QuantumManager):
     """Class to track and manage quantum states with the ket vector formalism."""
 
-    def __init__(self):
-        super().__init__("KET")
+    def __init__(self, dtype=complex128):
+        super().__init__("KET", dtype)
 
     def new(self, amplitudes=[complex(1), complex(0)]) -> int:        
-        key = self._least_available
-        self._least_available += 1
-        self.states[key] = KetState(amplitudes, [key])
+        key = len(self.states)
+        # copy amplitudes, as KetState keeps a reference to arrays
+        amplitudes = array(amplitudes, dtype=self.dtype)
+        self.states.append(KetState(amplitudes, [key], dtype=self.dtype))
         return key
 
     def run_circuit(self, circuit: "Circuit", keys: List[int]) -> int:
         super().run_circuit(circuit, keys)
-        new_state, all_keys, circ_mat = self._prepare_circuit(circuit, keys)
-
-        new_state = circ_mat @ new_state
+        new_state, all_keys = self._apply_circuit(circuit, keys)
 
         if len(circuit.measured_qubits) == 0:
             # set state, return no measurement result
-            new_ket = KetState(new_state, all_keys)
+            new_ket = KetState(new_state, all_keys, dtype=self.dtype)
             for key in all_keys:
                 self.states[key] = new_ket
             return None
@@ -163,7 +277,9 @@ class QuantumManagerKet(QuantumManager):
 
     def set(self, keys: List[int], amplitudes: List[complex]) -> None:
         super().set(keys, amplitudes)
-        new_state = KetState(amplitudes, keys)
+        # copy amplitudes, as KetState keeps a reference to arrays
+        amplitudes = array(amplitudes, dtype=self.dtype)
+        new_state = KetState(amplitudes, keys, dtype=self.dtype)
         for key in keys:
             self.states[key] = new_state
 
@@ -207,8 +323,7 @@ class QuantumManagerKet(QuantumManager):
         else:
             # swap states into correct position
             if not all([all_keys.index(key) == i for i, key in enumerate(keys)]):
-                all_keys, swap_mat = self._swap_qubits(all_keys, keys)
-                state = swap_mat @ state
+                state, all_keys = self._swap_qubits(state, all_keys, keys)
 
             # calculate meas probabilities and projected states
             len_diff = len(all_keys) - len(keys)
@@ -229,11 +344,11 @@ class QuantumManagerKet(QuantumManager):
 
         for res, key in zip(result_digits, keys):
             # set to state measured
-            new_state_obj = KetState(result_states[res], [key])
+            new_state_obj = KetState(result_states[res], [key], dtype=self.dtype)
             self.states[key] = new_state_obj
         
         if len(all_keys) > 0:
-            new_state_obj = KetState(new_state, all_keys)
+            new_state_obj = KetState(new_state, all_keys, dtype=self.dtype)
             for key in all_keys:
                 self.states[key] = new_state_obj
         
@@ -243,24 +358,21 @@ class QuantumManagerKet(QuantumManager):
 class QuantumManagerDensity(QuantumManager):
     """Class to track and manage states with the density matrix formalism."""
 
-    def __init__(self):
-        super().__init__("DENSITY")
+    def __init__(self, dtype=complex128):
+        super().__init__("DENSITY", dtype)
 
     def new(self, state=[[complex(1), complex(0)], [complex(0), complex(0)]]) -> int:        
-        key = self._least_available
-        self._least_available += 1
-        self.states[key] = DensityState(state, [key])
+        key = len(self.states)
+        self.states.append(DensityState(state, [key], dtype=self.dtype))
         return key
 
     def run_circuit(self, circuit: "Circuit", keys: List[int]) -> int:
         super().run_circuit(circuit, keys)
-        new_state, all_keys, circ_mat = super()._prepare_circuit(circuit, keys)
-
-        new_state = circ_mat @ new_state @ circ_mat.T
+        new_state, all_keys = super()._apply_circuit(circuit, keys)
 
         if len(circuit.measured_qubits) == 0:
             # set state, return no measurement result
-            new_state_obj = DensityState(new_state, all_keys)
+            new_state_obj = DensityState(new_state, all_keys, dtype=self.dtype)
             for key in all_keys:
                 self.states[key] = new_state_obj
             return None
@@ -271,7 +383,7 @@ class QuantumManagerDensity(QuantumManager):
 
     def set(self, keys: List[int], state: List[List[complex]]) -> None:
         super().set(keys, state)
-        new_state = DensityState(state, keys)
+        new_state = DensityState(state, keys, dtype=self.dtype)
         for key in keys:
             self.states[key] = new_state
 
@@ -317,8 +429,7 @@ class QuantumManagerDensity(QuantumManager):
         else:
             # swap states into correct position
             if not all([all_keys.index(key) == i for i, key in enumerate(keys)]):
-                all_keys, swap_mat = self._swap_qubits(all_keys, keys)
-                state = swap_mat @ state @ swap_mat.T
+                state, all_keys = self._swap_qubits(state, all_keys, keys)
 
             # calculate meas probabilities and projected states
             len_diff = len(all_keys) - len(keys)
@@ -334,7 +445,7 @@ class QuantumManagerDensity(QuantumManager):
         while len(result_digits) < len(keys):
             result_digits.insert(0, 0)
        
-        new_state_obj = DensityState(new_state, all_keys)
+        new_state_obj = DensityState(new_state, all_keys, dtype=self.dtype)
         for key in all_keys:
             self.states[key] = new_state_obj
     
@@ -349,17 +460,17 @@ class KetState():
         keys (List[int]): list of keys (qubits) associated with this state.
     """
 
-    def __init__(self, amplitudes: List[complex], keys: List[int]):
-        # check formatting
-        assert all([abs(a) <= 1.01 for a in amplitudes]), "Illegal value with abs > 1 in ket vector"
-        assert abs(sum([a ** 2 for a in amplitudes]) - 1) < 1e-5, "Squared amplitudes do not sum to 1" 
-        num_qubits = log2(len(amplitudes))
-        assert num_qubits.is_integer(), "Length of amplitudes should be 2 ** n, where n is the number of qubits"
-        assert num_qubits == len(keys), "Length of amplitudes should be 2 ** n, where n is the number of qubits"
-
-        self.state = array(amplitudes, dtype=complex)
+    def __init__(self, amplitudes: List[complex], keys: List[int], dtype=complex128):
+        self.state = asarray(amplitudes, dtype=dtype)
         self.keys = keys
 
+        # check formatting (vectorized, as states are built on every circuit)
+        assert (absolute(self.state) <= 1.01).all(), "Illegal value with abs > 1 in ket vector"
+        assert abs(vdot(self.state, self.state).real - 1) < 1e-5, "Squared amplitudes do not sum to 1"
+        dim = len(self.state)
+        assert dim & (dim - 1) == 0, "Length of amplitudes should be 2 ** n, where n is the number of qubits"
+        assert dim.bit_length() - 1 == len(keys), "Length of amplitudes should be 2 ** n, where n is the number of qubits"
+
     def __str__(self):
         return "\n".join(["Keys:", str(self.keys), "State:", str(self.state)])
 
@@ -372,25 +483,25 @@ class DensityState():
         keys (List[int]): list of keys (qubits) associated with this state.
     """
 
-    def __init__(self, state: List[List[complex]], keys: List[int]):
+    def __init__(self, state: List[List[complex]], keys: List[int], dtype=complex128):
         """Constructor for density state class.
 
         Args:
             state (List[List[complex]]): density matrix elements given as a list. If the list is one-dimensional, will be converted to matrix with outer product operation.
             keys (List[int]): list of keys to this state in quantum manager.
+            dtype (type): numpy complex type of matrix elements (default complex128).
         """
 
-        state = array(state, dtype=complex)
+        state = array(state, dtype=dtype)
         if state.ndim == 1:
             state = outer(state.conj(), state)
 
         # check formatting
-        assert abs(trace(array(state)) - 1) < 0.1, "density matrix trace must be 1"
-        for row in state:
-            assert len(state) == len(row), "density matrix must be square"
-        num_qubits = log2(len(state))
-        assert num_qubits.is_integer(), "Dimensions of density matrix should be 2 ** n, where n is the number of qubits"
-        assert num_qubits == len(keys), "Dimensions of density matrix should be 2 ** n, where n is the number of qubits"
+        assert abs(trace(state) - 1) < 0.1, "density matrix trace must be 1"
+        assert state.ndim == 2 and state.shape[0] == state.shape[1], "density matrix must be square"
+        dim = len(state)
+        assert dim & (dim - 1) == 0, "Dimensions of density matrix should be 2 ** n, where n is the number of qubits"
+        assert dim.bit_length() - 1 == len(keys), "Dimensions of density matrix should be 2 ** n, where n is the number of qubits"
 
         self.state = state
         self.keys = keys
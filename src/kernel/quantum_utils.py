@@ -7,7 +7,7 @@ from functools import lru_cache
 from typing import Tuple
 from math import sqrt
 
-from numpy import array, kron, identity, zeros, trace 
+from numpy import array, zeros, trace, vdot, complex128
 
 
 @lru_cache(maxsize=1000)
@@ -23,31 +23,23 @@ def measure_state_with_cache_ket(state: Tuple[complex, complex]) -> float:
 @lru_cache(maxsize=1000)
 def measure_entangled_state_with_cache_ket(state: Tuple[complex], state_index: int, num_states: int) -> Tuple[
         Tuple[complex], Tuple[complex], float]:
-    state = array(state)
-
-    # generate projectors
-    projector0 = [1]
-    projector1 = [1]
-    for i in range(num_states):
-        if i == state_index:
-            projector0 = kron(projector0, [1, 0])
-            projector1 = kron(projector1, [0, 1])
-        else:
-            projector0 = kron(projector0, identity(2))
-            projector1 = kron(projector1, identity(2))
+    # view state as tensor (qubits before, measured qubit, qubits after)
+    state = array(state).reshape(2 ** state_index, 2, 2 ** (num_states - state_index - 1))
+    projected0 = state[:, 0, :].reshape(-1)
+    projected1 = state[:, 1, :].reshape(-1)
 
     # probability of measuring basis[0]
-    prob_0 = (state.conj().T @ projector0.T @ projector0 @ state).real
+    prob_0 = vdot(projected0, projected0).real
 
     if prob_0 >= 1:
         state1 = None
     else:
-        state1 = (projector1 @ state) / sqrt(1 - prob_0)
+        state1 = projected1 / sqrt(1 - prob_0)
 
     if prob_0 <= 0:
         state0 = None
     else:
-        state0 = (projector0 @ state) / sqrt(prob_0)
+        state0 = projected0 / sqrt(prob_0)
 
     return (state0, state1, prob_0)
 
@@ -55,30 +47,32 @@ def measure_entangled_state_with_cache_ket(state: Tuple[complex], state_index: i
 @lru_cache(maxsize=1000)
 def measure_multiple_with_cache_ket(state: Tuple[complex], num_states: int, length_diff: int) -> Tuple[
         Tuple[Tuple[complex]], Tuple[float]]:
-    state = array(state)
     basis_count = 2 ** num_states
+    # view state as matrix with one row per measurement result
+    # (in double precision, so that probabilities sum to 1 for single-precision states)
+    state = array(state, dtype=complex128).reshape(basis_count, 2 ** length_diff)
 
-    # construct measurement operators, projectors, and probabilities of measurement
-    projectors = [None] * basis_count
+    # probabilities of measurement
     probabilities = [0] * basis_count
     for i in range(basis_count):
-        M = zeros((1, basis_count), dtype=complex)  # measurement operator
-        M[0, i] = 1
-        projectors[i] = kron(M, identity(2 ** length_diff))  # projector
-        probabilities[i] = (state.conj().T @ projectors[i].T @ projectors[i] @ state).real
+        probabilities[i] = vdot(state[i], state[i]).real
         if probabilities[i] < 0:
             probabilities[i] = 0
         if probabilities[i] > 1:
             probabilities[i] = 1
 
-    return_states = [None] * len(projectors)
-    for i, proj in enumerate(projectors):
+    return_states = [None] * basis_count
+    for i in range(basis_count):
         # project to new state
         if probabilities[i] > 0:
-            new_state = (proj @ state) / sqrt(probabilities[i])
+            new_state = state[i] / sqrt(probabilities[i])
             new_state = tuple(new_state)
             return_states[i] = new_state
 
+    # remove rounding error of state norm
+    total = sum(probabilities)
+    probabilities = [p / total for p in probabilities]
+
     return (tuple(return_states), tuple(probabilities))
 
 
@@ -95,60 +89,60 @@ def measure_state_with_cache_density(state: Tuple[Tuple[complex, complex]]) -> f
 @lru_cache(maxsize=1000)
 def measure_entangled_state_with_cache_density(state: Tuple[Tuple[complex]], state_index: int, num_states: int) -> Tuple[
         Tuple[complex], Tuple[complex], float]:
-    state = array(state)
-
-    # generate projectors
-    projector0 = [1]
-    projector1 = [1]
-    for i in range(num_states):
-        if i == state_index:
-            projector0 = kron(projector0, [[1, 0], [0, 0]])
-            projector1 = kron(projector1, [[0, 0], [0, 1]])
-        else:
-            projector0 = kron(projector0, identity(2))
-            projector1 = kron(projector1, identity(2))
+    # view state as tensor (qubits before, measured qubit, qubits after) for rows and columns
+    dim_before = 2 ** state_index
+    dim_after = 2 ** (num_states - state_index - 1)
+    state = array(state).reshape(dim_before, 2, dim_after, dim_before, 2, dim_after)
 
     # probability of measuring basis[0]
-    prob_0 = trace(state @ projector0).real
+    block_dim = dim_before * dim_after
+    prob_0 = trace(state[:, 0, :, :, 0, :].reshape(block_dim, block_dim)).real
 
     if prob_0 >= 1:
         state1 = None
     else:
-        state1 = (projector1 @ state @ projector1) / (1 - prob_0)
+        state1 = zeros(state.shape, dtype=complex)
+        state1[:, 1, :, :, 1, :] = state[:, 1, :, :, 1, :] / (1 - prob_0)
+        state1 = state1.reshape(2 * block_dim, 2 * block_dim)
 
     if prob_0 <= 0:
         state0 = None
     else:
-        state0 = (projector0 @ state @ projector0) / prob_0
+        state0 = zeros(state.shape, dtype=complex)
+        state0[:, 0, :, :, 0, :] = state[:, 0, :, :, 0, :] / prob_0
+        state0 = state0.reshape(2 * block_dim, 2 * block_dim)
 
     return (state0, state1, prob_0)
 
 @lru_cache(maxsize=1000)
 def measure_multiple_with_cache_density(state: Tuple[Tuple[complex]], num_states: int, length_diff: int) -> Tuple[
         Tuple[Tuple[complex]], Tuple[float]]:
-    state = array(state)
     basis_count = 2 ** num_states
+    dim_diff = 2 ** length_diff
+    # view state as blocks, indexed by measurement result for rows and columns
+    # (in double precision, so that probabilities sum to 1 for single-precision states)
+    state = array(state, dtype=complex128).reshape(basis_count, dim_diff, basis_count, dim_diff)
 
-    # construct measurement operators, projectors, and probabilities of measurement
-    projectors = [None] * basis_count
+    # probabilities of measurement
     probabilities = [0] * basis_count
     for i in range(basis_count):
-        M = zeros((basis_count, basis_count), dtype=complex)  # measurement operator
-        M[i, i] = 1
-        projectors[i] = kron(M, identity(2 ** length_diff))  # projector
-        probabilities[i] = trace(state @ projectors[i]).real
+        probabilities[i] = trace(state[i, :, i, :]).real
         if probabilities[i] < 0:
             probabilities[i] = 0
         if probabilities[i] > 1:
             probabilities[i] = 1
 
-    return_states = [None] * len(projectors)
-    for i, proj in enumerate(projectors):
+    return_states = [None] * basis_count
+    for i in range(basis_count):
         # project to new state
         if probabilities[i] > 0:
-            new_state = (proj @ state @ proj) / probabilities[i]
-            new_state = tuple(new_state)
+            new_state = zeros(state.shape, dtype=complex)
+            new_state[i, :, i, :] = state[i, :, i, :] / probabilities[i]
+            new_state = tuple(new_state.reshape(basis_count * dim_diff, basis_count * dim_diff))
             return_states[i] = new_state
 
-    return (tuple(return_states), tuple(probabilities))
+    # remove rounding error of state trace
+    total = sum(probabilities)
+    probabilities = [p / total for p in probabilities]
 
+    return (tuple(return_states), tuple(probabilities))
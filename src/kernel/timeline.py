@@ -13,6 +13,8 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .event import Event
 
+from numpy import complex128
+
 from .eventlist import EventList
 from ..utils import log
 from .quantum_manager import QuantumManagerKet, QuantumManagerDensity
@@ -43,11 +45,13 @@ class Timeline:
         quantum_manager (QuantumManager): quantum state manager.
     """
 
-    def __init__(self, stop_time=inf, formalism='ket_vector'):
+    def __init__(self, stop_time=inf, formalism='ket_vector', dtype=complex128):
         """Constructor for timeline.
 
         Args:
             stop_time (int): stop time (in ps) of simulation (default inf).
+            formalism (str): formalism of quantum states, 'ket_vector' or 'density_matrix' (default 'ket_vector').
+            dtype (type): numpy complex type of quantum state amplitudes (default complex128).
         """
         self.events = EventList()
         self.entities = []
@@ -59,9 +63,9 @@ class Timeline:
         self.show_progress = False
         
         if formalism == 'ket_vector':
-            self.quantum_manager = QuantumManagerKet()
+            self.quantum_manager = QuantumManagerKet(dtype)
         elif formalism == 'density_matrix':
-            self.quantum_manager = QuantumManagerDensity()
+            self.quantum_manager = QuantumManagerDensity(dtype)
         else:
             raise ValueError("Invalid formalism {}".format(formalism))
 
@@ -1,5 +1,5 @@
-from sequence.components.circuit import Circuit
-from numpy import array, array_equal, identity
+from sequence.components.circuit import Circuit, fuse
+from numpy import array, array_equal, allclose, identity, kron, complex64
 from pytest import raises
 
 
@@ -97,6 +97,73 @@ def test_measure():
     assert not qc._cache is None
 
 
+def test_fuse():
+    gates = [['h', [0]], ['x', [0]], ['cx', [0, 1]], ['cx', [0, 1]], ['z', [1]], ['x', [0]]]
+    fused = fuse(gates)
+    assert [indices for _, indices in fused] == [[0], [0, 1], [1], [0]]
+    h = array([[1, 1], [1, -1]]) / (2 ** 0.5)
+    assert allclose(fused[0][0], array([[0, 1], [1, 0]]) @ h)
+    assert allclose(fused[1][0], identity(4))
+    # unfused gates are shared with all circuits, so should not be writable
+    with raises(ValueError):
+        fused[2][0][0, 0] = 0
+
+    qc = Circuit(2)
+    qc.h(0)
+    qc.x(0)
+    qc.z(1)
+    qc.z(1)
+    qc.s(1)
+    expect = kron(array([[0, 1], [1, 0]]) @ h, array([[1, 0], [0, complex(0, 1)]]))
+    assert allclose(expect, qc.get_unitary_matrix())
+
+
+def test_unitary_cache():
+    qc1 = Circuit(2)
+    qc1.h(0)
+    qc1.cx(0, 1)
+    qc2 = Circuit(2)
+    qc2.h(0)
+    qc2.cx(0, 1)
+    assert qc1.get_unitary_matrix() is qc2.get_unitary_matrix()
+    assert qc1.get_unitary_matrix().flags['C_CONTIGUOUS']
+
+    qc2.x(1)
+    assert qc1.get_unitary_matrix() is not qc2.get_unitary_matrix()
+
+    mat = qc1.get_unitary_matrix(complex64)
+    assert mat.dtype == complex64 and mat.flags['C_CONTIGUOUS']
+    assert mat is qc1.get_unitary_matrix(complex64)
+    assert allclose(mat, qc1.get_unitary_matrix())
+
+    conj = qc1.get_unitary_matrix(complex64, conjugate=True)
+    assert conj is qc1.get_unitary_matrix(complex64, conjugate=True)
+    assert allclose(conj, mat.conj())
+
+
+def test_matrix_structure():
+    qc = Circuit(2)
+    qc.z(0)
+    qc.t(1)
+    kind, data = qc.get_matrix_structure()
+    assert kind == "diagonal"
+    assert array_equal(data[:, 0], qc.get_unitary_matrix().diagonal())
+    kind, data = qc.get_matrix_structure(conjugate=True)
+    assert kind == "diagonal"
+    assert array_equal(data[:, 0], qc.get_unitary_matrix().diagonal().conj())
+
+    qc = Circuit(2)
+    qc.cx(0, 1)
+    kind, data = qc.get_matrix_structure()
+    assert kind == "permutation"
+    assert array_equal(data, [0, 1, 3, 2])
+
+    qc = Circuit(2)
+    qc.h(0)
+    qc.cx(0, 1)
+    assert qc.get_matrix_structure() == ("dense", None)
+
+
 def test_Circuit():
     qc = Circuit(4)
     expect = identity(16)
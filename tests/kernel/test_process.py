@@ -1,4 +1,5 @@
 from sequence.kernel.process import Process
+from pytest import raises
 
 
 def test_run():
@@ -22,3 +23,14 @@ def test_run():
     assert a.counter == 1 and b.counter == 0
     p2.run()
     assert a.counter == 1 and b.counter == -10
+
+
+def test_slots():
+    class Dummy():
+        def add(self, x):
+            pass
+
+    p = Process(Dummy(), "add", [1])
+    assert not hasattr(p, "__dict__")
+    with raises(AttributeError):
+        p.foo = 1
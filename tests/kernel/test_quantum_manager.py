@@ -2,6 +2,7 @@ import numpy as np
 import math
 
 from sequence.kernel.quantum_manager import *
+from sequence.kernel.quantum_manager import _PERMUTATION_MIN_SIZE
 from sequence.components.circuit import Circuit
 
 
@@ -11,14 +12,21 @@ class DumbCircuit():
         self.matrix = matrix
         self.measured_qubits = []
 
-    def get_unitary_matrix(self):
-        return self.matrix
+    def get_unitary_matrix(self, dtype=np.complex128, conjugate=False):
+        matrix = np.ascontiguousarray(self.matrix, dtype=dtype)
+        if conjugate:
+            matrix = matrix.conj()
+        return matrix
+
+    def get_matrix_structure(self, dtype=np.complex128, conjugate=False):
+        return "dense", None
 
 
 def test_qmanager_get():
     qm = QuantumManagerKet()
-    qm.states[49] = "test_string"
-    assert qm.get(49) == "test_string"
+    key = qm.new()
+    qm.states[key] = "test_string"
+    assert qm.get(key) == "test_string"
 
 
 def test_qmanager_new():
@@ -50,12 +58,25 @@ def test_qmanager_set():
     assert (qm.get(key).state == qm.get(key2).state).all
     assert (qm.get(key).state == np.array(new_state)).all
 
+    # state should not share memory with supplied array
+    new_state = np.array([0, 1, 0, 0], dtype=complex)
+    qm.set(keys, new_state)
+    new_state[0] = 5
+    assert np.array_equal(qm.get(key).state, [0, 1, 0, 0])
+    new_state = np.array([1, 0], dtype=complex)
+    key3 = qm.new(new_state)
+    new_state[0] = 5
+    assert np.array_equal(qm.get(key3).state, [1, 0])
+
 
 def test_qmanager_remove():
     qm = QuantumManagerKet()
-    qm.states[0] = "test_string"
-    qm.remove(0)
-    assert len(qm.states.keys()) == 0
+    key1 = qm.new()
+    key2 = qm.new()
+    qm.remove(key1)
+    assert qm.get(key1) is None
+    assert qm.get(key2).keys == [key2]
+    assert qm.new() == 2
 
 
 def test_qmanager_circuit():
@@ -118,6 +139,173 @@ def test_qmanager_circuit():
     assert np.array_equal(qm.get(key1).state, qm.get(key3).state)
 
 
+def test_qmanager_circuit_permuted():
+    qm = QuantumManagerKet()
+
+    # CNOT with control on second qubit of a compound state, target on a separate state
+    key1 = qm.new()
+    key2 = qm.new()
+    key3 = qm.new()
+    qm.set([key1, key2], [0.5 ** 0.5, 0, 0, 0.5 ** 0.5])
+    circuit = Circuit(2)
+    circuit.cx(0, 1)
+    qm.run_circuit(circuit, [key2, key3])
+
+    ket = qm.get(key1)
+    assert ket is qm.get(key2) and ket is qm.get(key3)
+    assert ket.keys == [key2, key3, key1]
+    # amplitudes of |key2 key3 key1> = (|000> + |111>) / sqrt(2)
+    expect = np.zeros(8)
+    expect[0] = expect[7] = 0.5 ** 0.5
+    assert np.allclose(ket.state, expect)
+
+    # density matrix formalism should give the same (pure) state
+    qm = QuantumManagerDensity()
+    key1 = qm.new()
+    key2 = qm.new()
+    key3 = qm.new()
+    qm.set([key1, key2], np.outer([0.5 ** 0.5, 0, 0, 0.5 ** 0.5], [0.5 ** 0.5, 0, 0, 0.5 ** 0.5]))
+    qm.run_circuit(circuit, [key2, key3])
+    density = qm.get(key1)
+    assert density.keys == [key2, key3, key1]
+    assert np.allclose(density.state, np.outer(expect, expect))
+
+
+def test_qmanager_circuit_structured():
+    # diagonal (Z, S) and permutation (X, SWAP) circuits compared with dense matrix product
+    amplitudes = np.array([1, 2, 3, 4, 5, 6, 7, 8j]) / np.sqrt(204)
+    for gates in [["z", "s"], ["x", "swap"], ["h", "t"]]:
+        qm = QuantumManagerKet()
+        keys = [qm.new(), qm.new(), qm.new()]
+        qm.set(keys, amplitudes)
+        circuit = Circuit(2)
+        for gate in gates:
+            if gate == "swap":
+                circuit.swap(0, 1)
+            else:
+                getattr(circuit, gate)(1)
+        qm.run_circuit(circuit, [keys[0], keys[1]])
+        expect = np.kron(circuit.get_unitary_matrix(), np.identity(2)) @ amplitudes
+        assert np.allclose(qm.get(keys[0]).state, expect)
+
+
+def test_qmanager_circuit_permutation_large():
+    # permutation circuits on states large enough to be applied with `take` (8 qubits, 256 amplitudes)
+    num_qubits = 8
+    dim = 2 ** num_qubits
+    assert dim >= _PERMUTATION_MIN_SIZE
+    amplitudes = np.arange(1, dim + 1) * np.exp(1j * np.arange(dim))
+    amplitudes /= np.linalg.norm(amplitudes)
+
+    for gates in [[("x", [0])], [("cx", [0, 1])], [("ccx", [0, 1, 2])], [("swap", [0, 1]), ("x", [1])]]:
+        circuit = Circuit(3)
+        for name, indices in gates:
+            getattr(circuit, name)(*indices)
+        assert circuit.get_matrix_structure()[0] == "permutation"
+        # circuit acts on qubits 5, 2, 7 of the compound state
+        targets = [5, 2, 7]
+        rest = [i for i in range(num_qubits) if i not in targets]
+
+        qm = QuantumManagerKet()
+        keys = [qm.new() for _ in range(num_qubits)]
+        qm.set(keys, amplitudes)
+        qm.run_circuit(circuit, [keys[i] for i in targets])
+        ket = qm.get(keys[0])
+
+        # expected state with circuit qubits in front
+        tensor = amplitudes.reshape((2,) * num_qubits).transpose(targets + rest).reshape(8, -1)
+        expect = (circuit.get_unitary_matrix() @ tensor).reshape(-1)
+        assert ket.keys == [keys[i] for i in targets + rest]
+        assert np.allclose(ket.state, expect)
+
+        qm = QuantumManagerDensity()
+        keys = [qm.new() for _ in range(num_qubits)]
+        qm.set(keys, np.outer(amplitudes, amplitudes.conj()))
+        qm.run_circuit(circuit, [keys[i] for i in targets])
+        density = qm.get(keys[0])
+        assert density.keys == [keys[i] for i in targets + rest]
+        assert np.allclose(density.state, np.outer(expect, expect.conj()))
+
+
+def test_qmanager_circuit_dtype():
+    for qm in [QuantumManagerKet(dtype=np.complex64), QuantumManagerDensity(dtype=np.complex64)]:
+        key1 = qm.new()
+        key2 = qm.new()
+        circuit = Circuit(2)
+        circuit.h(0)
+        circuit.cx(0, 1)
+        qm.run_circuit(circuit, [key1, key2])
+        state = qm.get(key1).state
+        assert state.dtype == np.complex64
+        expect = np.array([0.5 ** 0.5, 0, 0, 0.5 ** 0.5])
+        if qm.formalism == "DENSITY":
+            expect = np.outer(expect, expect)
+        assert np.allclose(state, expect, atol=1e-6)
+
+
+def test_qmanager_circuit_dtype_drift():
+    # repeated circuits in single precision should not drift out of normalization
+    circuit = Circuit(2)
+    circuit.h(0)
+    circuit.t(0)
+    circuit.cx(0, 1)
+    circuit.h(1)
+    circuit.t(1)
+    for qm in [QuantumManagerKet(dtype=np.complex64), QuantumManagerDensity(dtype=np.complex64)]:
+        key1 = qm.new()
+        key2 = qm.new()
+        for _ in range(2000):
+            qm.run_circuit(circuit, [key1, key2])
+        state = qm.get(key1).state
+        if qm.formalism == "DENSITY":
+            assert abs(np.trace(state) - 1) < 1e-5
+        else:
+            assert abs(np.vdot(state, state) - 1) < 1e-5
+
+
+def test_qmanager_circuit_dtype_measure():
+    # measurement of multiple qubits in single precision (probabilities must sum to 1 in double precision)
+    circuit = Circuit(4)
+    circuit.h(0)
+    circuit.t(0)
+    circuit.cx(0, 1)
+    circuit.h(2)
+    circuit.cx(2, 3)
+    circuit.t(3)
+    circuit.measure(1)
+    circuit.measure(2)
+
+    # entanglement swapping of two Bell pairs
+    swap_circuit = Circuit(2)
+    swap_circuit.cx(0, 1)
+    swap_circuit.h(0)
+    swap_circuit.measure(0)
+    swap_circuit.measure(1)
+    bell = np.array([0.5 ** 0.5, 0, 0, 0.5 ** 0.5])
+
+    for qm in [QuantumManagerKet(dtype=np.complex64), QuantumManagerDensity(dtype=np.complex64)]:
+        for _ in range(100):
+            keys = [qm.new() for _ in range(4)]
+            res = qm.run_circuit(circuit, keys)
+            assert set(res.keys()) == {keys[1], keys[2]}
+            assert qm.get(keys[0]).state.dtype == np.complex64
+
+            keys = [qm.new() for _ in range(4)]
+            if qm.formalism == "DENSITY":
+                qm.set(keys[:2], np.outer(bell, bell))
+                qm.set(keys[2:], np.outer(bell, bell))
+            else:
+                qm.set(keys[:2], bell)
+                qm.set(keys[2:], bell)
+            res = qm.run_circuit(swap_circuit, [keys[1], keys[2]])
+            assert set(res.keys()) == {keys[1], keys[2]}
+            state = qm.get(keys[0]).state
+            if qm.formalism == "DENSITY":
+                assert abs(np.trace(state) - 1) < 1e-5
+            else:
+                assert abs(np.vdot(state, state) - 1) < 1e-5
+
+
 def test_qmanager_circuit_density():
     qm = QuantumManagerDensity()
 
@@ -259,6 +447,24 @@ def test_qmanager__measure():
 
     assert abs((len(meas_0) / NUM_TESTS) - 0.5) < 0.1
 
+def test_qmanager__measure_swap():
+    # |key1 key2 key3> = |011>, measured out of order
+    qm = QuantumManagerKet()
+    keys = [qm.new(), qm.new(), qm.new()]
+    state = np.zeros(8)
+    state[3] = 1
+    qm.set(keys, state)
+    res = qm._measure(state, [keys[2], keys[0]], list(keys))
+    assert res == {keys[2]: 1, keys[0]: 0}
+    assert np.allclose(qm.get(keys[1]).state, [0, 1])
+
+    qm = QuantumManagerDensity()
+    keys = [qm.new(), qm.new(), qm.new()]
+    qm.set(keys, np.outer(state, state))
+    res = qm._measure(np.outer(state, state), [keys[2], keys[0]], list(keys))
+    assert res == {keys[2]: 1, keys[0]: 0}
+
+
 def test_qmanager__measure_density():
     NUM_TESTS = 1000
 
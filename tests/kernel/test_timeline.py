@@ -1,3 +1,5 @@
+import numpy as np
+
 from sequence.kernel.entity import Entity
 from sequence.kernel.event import Event
 from sequence.kernel.process import Process
@@ -92,3 +94,14 @@ def test_update_event_time():
     tl.run()
 
     assert d1.click_time == 10 and d2.click_time == 20
+
+
+def test_dtype():
+    tl = Timeline()
+    key = tl.quantum_manager.new()
+    assert tl.quantum_manager.get(key).state.dtype == np.complex128
+
+    tl = Timeline(formalism='density_matrix', dtype=np.complex64)
+    key = tl.quantum_manager.new()
+    assert tl.quantum_manager.dtype == np.complex64
+    assert tl.quantum_manager.get(key).state.dtype == np.complex64